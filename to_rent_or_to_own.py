@@ -13,11 +13,11 @@
 # limitations under the License.
 
 from dataclasses import dataclass
-import math
+from matplotlib.figure import Figure
 from streamlit.logger import get_logger
 from utils import Parameters
 
-import matplotlib.pyplot as plt
+import io
 import matplotlib.ticker as ticker
 import numpy as np
 import streamlit as st
@@ -26,6 +26,9 @@ import utils
 
 LOGGER = get_logger(__name__)
 
+# Upper bound on the number of points drawn per curve, the simulation stays monthly.
+MAX_PLOTTED_POINTS = 500
+
 
 ########################################
 # Utilities to compute financial values.
@@ -37,26 +40,24 @@ def define_inputs() -> Parameters:
     # 1. Real Estate Parameters
     # 2. Equity Parameters
     # 3. Secondary Parameters: Not crucial to the primary simulation.
-    params = Parameters()
-
     with st.expander("House Cost and Rent", expanded=True):
         col1, col2 = st.columns(2)
         with col1:
             # House equity in the first year.. Assumed to grow as `roi_real_estate`.
-            params.base_house_equity = st.number_input(
+            base_house_equity = st.number_input(
                 "House Value ($)",
                 value=700000,
                 placeholder="Enter house value in the first year.",
             )
 
         with col2:
-            params.monthly_income = st.number_input(
+            monthly_income = st.number_input(
                 label="Monthly Income ($):",
                 value=5000,
                 help="Monthly Income ($) for calculations.",
             )
 
-        params.price_to_rent_ratio = st.slider(
+        price_to_rent_ratio = st.slider(
             label="Price to Rent Ratio:",
             min_value=1,
             max_value=100,
@@ -67,7 +68,7 @@ def define_inputs() -> Parameters:
     col1, col2 = st.columns(2)
     with col1:
         with st.expander("Equity Parameters", expanded=True):
-            params.roi_stocks = 0.01 * st.slider(
+            roi_stocks = 0.01 * st.slider(
                 label="Annual Return % (Equity):",
                 min_value=0.0,
                 max_value=20.0,
@@ -77,7 +78,7 @@ def define_inputs() -> Parameters:
 
     with col2:
         with st.expander("Simulation Parameters", expanded=True):
-            params.num_years = st.slider(
+            num_years = st.slider(
                 label="Number of years to simulate:",
                 min_value=1,
                 max_value=50,
@@ -89,14 +90,14 @@ def define_inputs() -> Parameters:
     with st.expander("Real Estate Parameters", expanded=True):
         col1, col2 = st.columns(2)
         with col1:
-            params.roi_real_estate = 0.01 * st.slider(
+            roi_real_estate = 0.01 * st.slider(
                 label="Annual Return % (Real Estate):",
                 min_value=0.0,
                 max_value=20.0,
                 value=6.5,
                 help="Rate of expected return in real estate. Also assumed to be the annual increase in Rent. 5.4\% YoY historically from 1992 to 2022. Can assume closer to 7\% in the past decade.",
             )
-            params.mortgage_interest_rate = 0.01 * st.slider(
+            mortgage_interest_rate = 0.01 * st.slider(
                 label="Mortgage Interest Rate (%):",
                 min_value=0.0,
                 max_value=20.0,
@@ -105,7 +106,7 @@ def define_inputs() -> Parameters:
             )
 
         with col2:
-            params.downpayment_ratio = 0.01 * st.slider(
+            downpayment_ratio = 0.01 * st.slider(
                 label="Downpayment (%):",
                 min_value=0,
                 max_value=100,
@@ -116,7 +117,7 @@ def define_inputs() -> Parameters:
             # Assumed to be 1% of base house equity, and 1% of base towards maintenance (amortized).
             # Let's assume insurance is ~0.
             # Based on https://www.investopedia.com/financial-edge/0411/7-homeowner-costs-renters-dont-pay.aspx.
-            params.base_house_misc_costs = 0.01 * st.slider(
+            base_house_misc_costs = 0.01 * st.slider(
                 label="Misc Housing Costs (%):",
                 min_value=0.0,
                 max_value=10.0,
@@ -126,9 +127,20 @@ def define_inputs() -> Parameters:
 
     # House rent in the first year. Assumed to grow as `roi_real_estate`.
     # San Jose price to rent ratio is 38.
-    params.base_rent_per_year = params.base_house_equity / params.price_to_rent_ratio
-
-    return params
+    base_rent_per_year = base_house_equity / price_to_rent_ratio
+
+    return Parameters(
+        roi_real_estate=roi_real_estate,
+        roi_stocks=roi_stocks,
+        mortgage_interest_rate=mortgage_interest_rate,
+        base_house_misc_costs=base_house_misc_costs,
+        downpayment_ratio=downpayment_ratio,
+        base_house_equity=base_house_equity,
+        price_to_rent_ratio=price_to_rent_ratio,
+        base_rent_per_year=base_rent_per_year,
+        num_years=num_years,
+        monthly_income=monthly_income,
+    )
 
 
 def display_financial_info(buy: utils.FinancialStatus, rent: utils.FinancialStatus):
@@ -152,24 +164,32 @@ def display_financial_info(buy: utils.FinancialStatus, rent: utils.FinancialStat
             st.markdown(f"* Monthly Excess: ${rent.monthly_excess():,.2f} / month")
 
 
-def simulate(buy: utils.FinancialStatus, rent: utils.FinancialStatus):
-    times = np.array(range(buy.params.num_years * utils.MONTHS), dtype=np.double) / utils.MONTHS
-
-    # Calculate equity values for renting and buying.
-    equity_after_buying, equity_after_renting = [], []
-    for m in times:
-        equity_after_buying.append(buy.net_worth())
-        equity_after_renting.append(rent.net_worth())
-        buy.increment_by_month()
-        rent.increment_by_month()
-    
-    return np.array(equity_after_buying), np.array(equity_after_renting), times
-
-
-def plot_comparisons(buy: np.array, rent: np.array, times: np.array):
-    # Create a figure and axis for the plot
-    fig, ax = plt.subplots()  
-    marker_frequency = times.shape[0] / math.ceil(np.max(times))
+@st.cache_data
+def simulate(params: Parameters):
+    # Reruns triggered by unrelated widgets reuse the cached trajectories.
+    net_worth_buy, net_worth_rent, times = utils.simulate_vectorized(
+        params, dtype=np.float32
+    )
+    # Columns are the net worth after buying, after renting and the time in years.
+    # Column-major, so that every column is contiguous when plotted.
+    trajectories = np.empty((times.size, 3), dtype=np.float32, order="F")
+    trajectories[:, 0] = net_worth_buy
+    trajectories[:, 1] = net_worth_rent
+    trajectories[:, 2] = times
+    return trajectories
+
+
+@st.cache_data(max_entries=16)
+def render_comparison_png(trajectories: np.array, stride: int) -> bytes:
+    buy, rent, times = trajectories[:, 0], trajectories[:, 1], trajectories[:, 2]
+
+    # Create a figure and axis for the plot. The figure is kept out of pyplot's global
+    # registry, since sessions render concurrently from their own threads.
+    fig = Figure()
+    ax = fig.subplots()
+    # One marker per year, a float `markevery` would be read as an axes fraction.
+    # Every plotted point is `stride` months apart.
+    marker_frequency = max(1, utils.MONTHS // stride)
 
     # Plotting the 'Buying' scenario
     ax.plot(
@@ -232,8 +252,15 @@ def plot_comparisons(buy: np.array, rent: np.array, times: np.array):
     ax.margins(x=0.025, y=0.025)
     ax.spines[["right", "top", "left", "bottom"]].set_visible(False)
 
-    # Display the plot in Streamlit
-    st.pyplot(fig)
+    # Only the rendered PNG is cached and shared across sessions, never the figure.
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight", dpi=200)
+    return buffer.getvalue()
+
+
+def plot_comparisons(trajectories: np.array, stride: int):
+    # Display the plot in Streamlit, drawing every `stride`-th month.
+    st.image(render_comparison_png(trajectories[::stride], stride), width="stretch")
 
 
 def run():
@@ -256,10 +283,12 @@ def run():
     # Add some space after the inputs.
     st.write(" ")
 
-    net_worth_buy, net_worth_rent, times = simulate(buy, rent)
+    trajectories = simulate(params)
+    # Ceiling division, so that at most `MAX_PLOTTED_POINTS` are drawn.
+    stride = max(1, -(-trajectories.shape[0] // MAX_PLOTTED_POINTS))
     # with st.expander("View Plot", expanded=True):
     with st.container():
-        plot_comparisons(net_worth_buy, net_worth_rent, times)
+        plot_comparisons(trajectories, stride)
 
     # Streamlit widgets automatically run the script from top to bottom. Since
     # this button is not connected to any other logic, it just causes a plain
@@ -13,13 +13,14 @@
 # limitations under the License.
 
 
-from dataclasses import dataclass
-from dateutil.relativedelta import relativedelta
+from dataclasses import dataclass, field
 from enum import Enum
 from pprint import pprint
+from typing import Callable
+import functools
 
+from numba import njit
 import numpy as np
-import numpy_financial as npf
 
 
 # Setup basic constants.
@@ -31,7 +32,7 @@ class Decision(Enum):
     BUY = 2
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Parameters:
     # Rate of returns, interest, fees, etc.
     roi_real_estate: float = 0
@@ -49,6 +50,19 @@ class Parameters:
     monthly_income: int = 0
 
 
+@functools.lru_cache(maxsize=128)
+def _pmt(rate: float, n: int, principal: float) -> float:
+    # Fixed payment at the end of every period that repays `principal` in `n` periods.
+    if rate == 0:
+        return principal / n
+    return principal * rate / (1.0 - (1.0 + rate) ** (-n))
+
+
+# Uncached variant of `_pmt`, callable from numba kernels.
+_pmt_jit = njit(cache=True)(_pmt.__wrapped__)
+
+
+@dataclass(slots=True, eq=False)
 class FinancialStatus:
     """Describes your current financial status, excess investment flow,
     net worth and additional info.
@@ -57,20 +71,31 @@ class FinancialStatus:
     current net worth, tracking growth of various assets such as real estate and equity.
     """
 
-    def __init__(self, decision: Decision, params: Parameters):
-        self.params = params
-        self.decision = decision
+    decision: Decision
+    params: Parameters
+    # Internal state, initialized from `params` based on the `decision`.
+    monthly_income: float = field(init=False, default=0)
+    equity_real_estate: float = field(init=False, default=0)
+    equity_stocks: float = field(init=False, default=0)
+    latest_taxable_house_value: float = field(init=False, default=0)
+    remaining_mortgage_equity: float = field(init=False, default=0)
+    monthly_expenses: float = field(init=False, default=0)
+    _cumulative_real_estate_roi: float = field(init=False, default=1.0)
+    _g_stocks_m: float = field(init=False, default=1.0)
+    _g_re_m: float = field(init=False, default=1.0)
+    _mortgage_principal_decrement: float = field(init=False, default=0)
+    _fixed_monthly_mortgage: float = field(init=False, default=0)
+    _month_idx: int = field(init=False, default=0)
+    # Decision specific steps, resolved once since the decision never changes. These
+    # are plain functions taking the status, so copies don't step the original.
+    _step_month_fn: Callable = field(init=False, repr=False)
+    _annual_reevaluations_fn: Callable = field(init=False, repr=False)
+
+    def __post_init__(self):
         self.monthly_income = self.params.monthly_income
-
-        self.equity_real_estate = self.equity_stocks = 0
-        self.latest_taxable_house_value = 0
-        self.remaining_mortgage_equity = 0
-        self.monthly_expenses = 0
-        self._cumulative_real_estate_roi = 1.0
+        self._precompute_rates()
         self._instantiate_internal_state()
 
-        self.time = relativedelta(months=0)
-
     def monthly_excess(self):
         return self.monthly_income - self.monthly_expenses
 
@@ -80,15 +105,16 @@ class FinancialStatus:
         )
     
     def monthly_mortgage(self):
-        # Returns negative for a payment.
-        monthly_mortgage_rate = ((1 + self.params.mortgage_interest_rate) ** (1 / MONTHS)) - 1
-        return -npf.pmt(
-            monthly_mortgage_rate,
-            self.params.num_years * MONTHS,
-            self.params.base_house_equity * (1 - self.params.downpayment_ratio),
-            fv=0,
-            when="end",
-        )
+        return get_monthly_mortgage_repayment(self.params)
+
+    def _precompute_rates(self):
+        # Monthly growth factors and mortgage repayment stay fixed for the simulation.
+        self._g_stocks_m = (1 + self.params.roi_stocks) ** (1.0 / MONTHS)
+        self._g_re_m = (1 + self.params.roi_real_estate) ** (1.0 / MONTHS)
+        self._mortgage_principal_decrement = (
+            self.params.base_house_equity * (1.0 - self.params.downpayment_ratio)
+        ) / (self.params.num_years * MONTHS)
+        self._fixed_monthly_mortgage = self.monthly_mortgage()
 
     def _instantiate_internal_state(self):
         if self.decision == Decision.BUY:
@@ -98,7 +124,9 @@ class FinancialStatus:
                 1.0 - self.params.downpayment_ratio
             )
             self.equity_stocks = 0
-            self.monthly_expenses = get_monthly_mortgage_repayment(self.params) + self.monthly_misc_costs()
+            self.monthly_expenses = self._fixed_monthly_mortgage + self.monthly_misc_costs()
+            self._step_month_fn = FinancialStatus._step_month_buy
+            self._annual_reevaluations_fn = FinancialStatus._annual_reevaluations_buy
         elif self.decision == Decision.RENT:
             self.equity_real_estate = 0
             self.remaining_mortgage_equity = 0
@@ -106,45 +134,69 @@ class FinancialStatus:
                 self.params.base_house_equity * self.params.downpayment_ratio
             )
             self.monthly_expenses = self.params.base_rent_per_year / MONTHS
+            # Renting has no mortgage to repay, only the equity grows.
+            self._step_month_fn = FinancialStatus._grow_equity_by_month
+            self._annual_reevaluations_fn = FinancialStatus._annual_reevaluations_rent
         else:
             raise ValueError(f"Invalid decision: {self.decision}")
 
     def increment_by_month(self, roi_stocks=None, roi_real_estate=None):
-        # Increment time by one month.
-        self.time += relativedelta(months=1)
+        # Increment time by one month, reevaluating at the end of every year.
+        self.step_month(roi_stocks, roi_real_estate)
+        self._month_idx += 1
+        if self._month_idx % MONTHS == 0:
+            self.annual_reevaluations()
+
+    def end_year(self):
+        # Closes a year stepped through `step_month`, keeping the month count in sync
+        # for any later `increment_by_month` calls.
+        self._month_idx += MONTHS
+        self.annual_reevaluations()
+
+    def step_month(self, roi_stocks=None, roi_real_estate=None):
+        # Grows the equity by one month, without any annual reevaluations.
+        self._step_month_fn(self, roi_stocks, roi_real_estate)
+
+    def annual_reevaluations(self):
+        # Update the rent, house value and any other commitments annually.
+        self._annual_reevaluations_fn(self)
 
-        # If ROIs are not provided, initialize with defaults.
-        if roi_stocks is None:
-            roi_stocks = self.params.roi_stocks
-        if roi_real_estate is None:
-            roi_real_estate = self.params.roi_real_estate
+    def _grow_equity_by_month(self, roi_stocks=None, roi_real_estate=None):
+        # Grows the equity by one month, without any annual reevaluations.
+
+        # If ROIs are not provided, use the precomputed monthly growth factors.
+        g_stocks_m = self._g_stocks_m
+        if roi_stocks is not None:
+            g_stocks_m = (1 + roi_stocks) ** (1.0 / MONTHS)
+        g_re_m = self._g_re_m
+        if roi_real_estate is not None:
+            g_re_m = (1 + roi_real_estate) ** (1.0 / MONTHS)
 
         # Model equity increase over the past month.
-        self.equity_stocks *= (1 + roi_stocks) ** (1.0 / MONTHS)
-        self.equity_real_estate *= (1 + roi_real_estate) ** (1.0 / MONTHS)
+        self.equity_stocks *= g_stocks_m
+        self.equity_real_estate *= g_re_m
         # Store the cumulative real estate ROI so far.
-        self._cumulative_real_estate_roi *= (1 + roi_real_estate) ** (1.0 / MONTHS)
+        self._cumulative_real_estate_roi *= g_re_m
         # Account for equity increase/decrease by adding the monthly cash flow.
         self.equity_stocks += self.monthly_excess()
 
-        if self.decision == Decision.BUY:
-            # Assume the remaining mortgage equity uniformly decreases over `num_years`.
-            self.remaining_mortgage_equity -= (
-                self.params.base_house_equity * (1.0 - self.params.downpayment_ratio)
-            ) / (self.params.num_years * MONTHS)
+    def _step_month_buy(self, roi_stocks=None, roi_real_estate=None):
+        self._grow_equity_by_month(roi_stocks, roi_real_estate)
+        # Assume the remaining mortgage equity uniformly decreases over `num_years`.
+        self.remaining_mortgage_equity -= self._mortgage_principal_decrement
 
-        if self.time.months % MONTHS == 0:
-            self.annual_reevaluations()
+    def _annual_reevaluations_buy(self):
+        # Update the house value and any other commitments annually.
+        self.latest_taxable_house_value = self.params.base_house_equity * self._cumulative_real_estate_roi
+        # Only the misc costs change, the mortgage repayment is fixed.
+        self.monthly_expenses = self._fixed_monthly_mortgage + self.monthly_misc_costs()
 
-    def annual_reevaluations(self):
-        # Update the rent, house value and any other commitments annually.
+    def _annual_reevaluations_rent(self):
+        # Update the rent and house value annually.
         self.latest_taxable_house_value = self.params.base_house_equity * self._cumulative_real_estate_roi
-        if self.decision == Decision.BUY:
-            self.monthly_expenses = self.monthly_mortgage() + self.monthly_misc_costs()
-        elif self.decision == Decision.RENT:
-            self.monthly_expenses = (
-                self.params.base_rent_per_year * self._cumulative_real_estate_roi
-            ) / MONTHS
+        self.monthly_expenses = (
+            self.params.base_rent_per_year * self._cumulative_real_estate_roi
+        ) / MONTHS
 
     def net_worth(self):
         return (
@@ -164,26 +216,276 @@ class FinancialStatus:
         pprint(f"Cumulative RoI: {self._cumulative_real_estate_roi}")
 
 
+################################################################################
+# Simulations over the full time period, returning the monthly net worth.
+################################################################################
+
+
+def simulate_by_month(buy: FinancialStatus, rent: FinancialStatus):
+    """Steps both financial statuses month by month, tracking their net worth.
+
+    Reference implementation for `simulate_vectorized`.
+    """
+    num_months = buy.params.num_years * MONTHS
+    times = np.arange(num_months, dtype=np.float64) / MONTHS
+
+    # Calculate equity values for renting and buying.
+    equity_after_buying = np.empty(num_months, dtype=np.float64)
+    equity_after_renting = np.empty(num_months, dtype=np.float64)
+    for year in range(buy.params.num_years):
+        for month in range(MONTHS):
+            m = year * MONTHS + month
+            equity_after_buying[m] = buy.net_worth()
+            equity_after_renting[m] = rent.net_worth()
+            buy.step_month()
+            rent.step_month()
+        buy.end_year()
+        rent.end_year()
+
+    return equity_after_buying, equity_after_renting, times
+
+
+def _compound_monthly_excess(initial_stocks, monthly_excess, eq_factor, g_eq_m):
+    # Solves `S[m + 1] = S[m] * g + excess[m]` in closed form, i.e.
+    # `S[m] = g^m * (S[0] + sum_{k < m} excess[k] * g^-(k + 1))`.
+    discounted_excess = monthly_excess / (eq_factor * g_eq_m)
+    return eq_factor * (
+        initial_stocks + np.cumsum(discounted_excess) - discounted_excess
+    )
+
+
+def simulate_vectorized(params: Parameters, dtype=np.float64):
+    """Computes the same trajectories as `simulate_by_month` without a Python loop.
+
+    Returns the monthly net worth after buying and renting, along with the time in years.
+    `np.float32` is accurate enough for plotting and halves the memory traffic.
+    """
+    num_months = params.num_years * MONTHS
+    months = np.arange(num_months, dtype=dtype)
+    g_re_m = (1 + params.roi_real_estate) ** (1.0 / MONTHS)
+    g_eq_m = (1 + params.roi_stocks) ** (1.0 / MONTHS)
+    re_factor = np.power(g_re_m, months)
+    eq_factor = np.power(g_eq_m, months)
+    # Rent, house value and misc costs are only reevaluated at the end of every year.
+    annual_re_factor = np.power(g_re_m, MONTHS * (months // MONTHS))
+
+    # Buying: the house grows, the mortgage is uniformly repaid and the rest is invested.
+    house_value = params.base_house_equity * annual_re_factor
+    buy_expenses = (
+        get_monthly_mortgage_repayment(params)
+        + params.base_house_misc_costs * house_value / MONTHS
+    )
+    base_mortgage = params.base_house_equity * (1.0 - params.downpayment_ratio)
+    remaining_mortgage = base_mortgage * (1.0 - months / num_months)
+    equity_after_buying = (
+        params.base_house_equity * re_factor
+        + _compound_monthly_excess(
+            0.0, params.monthly_income - buy_expenses, eq_factor, g_eq_m
+        )
+        - remaining_mortgage
+    )
+
+    # Renting: the downpayment and any excess income is invested in stocks.
+    rent_expenses = params.base_rent_per_year * annual_re_factor / MONTHS
+    equity_after_renting = _compound_monthly_excess(
+        params.base_house_equity * params.downpayment_ratio,
+        params.monthly_income - rent_expenses,
+        eq_factor,
+        g_eq_m,
+    )
+
+    return equity_after_buying, equity_after_renting, months / MONTHS
+
+
+@njit(cache=True)
+def _step_pair(
+    buy_state, rent_state, g_re_m, g_eq_m, monthly_income, mortgage_principal_decrement
+):
+    # Advances both decisions by one month, sharing the loaded growth factors.
+    buy_real_estate, buy_stocks, buy_mortgage, buy_expenses = buy_state
+    rent_stocks, rent_expenses = rent_state
+    buy_state = (
+        buy_real_estate * g_re_m,
+        buy_stocks * g_eq_m + monthly_income - buy_expenses,
+        buy_mortgage - mortgage_principal_decrement,
+        buy_expenses,
+    )
+    rent_state = (rent_stocks * g_eq_m + monthly_income - rent_expenses, rent_expenses)
+    return buy_state, rent_state
+
+
+@njit(cache=True)
+def _simulate_core(
+    roi_real_estate,
+    roi_stocks,
+    mortgage_interest_rate,
+    base_house_misc_costs,
+    downpayment_ratio,
+    base_house_equity,
+    base_rent_per_year,
+    monthly_income,
+    num_years,
+):
+    # Same recurrence as `FinancialStatus.increment_by_month`, unrolled into scalars.
+    num_months = num_years * MONTHS
+    g_re_m = (1.0 + roi_real_estate) ** (1.0 / MONTHS)
+    g_eq_m = (1.0 + roi_stocks) ** (1.0 / MONTHS)
+
+    principal = base_house_equity * (1.0 - downpayment_ratio)
+    monthly_mortgage_rate = (1.0 + mortgage_interest_rate) ** (1.0 / MONTHS) - 1.0
+    monthly_mortgage = _pmt_jit(monthly_mortgage_rate, num_months, principal)
+    mortgage_principal_decrement = principal / num_months
+
+    # (real estate, stocks, remaining mortgage, monthly expenses) when buying and
+    # (stocks, monthly expenses) when renting.
+    buy_state = (
+        base_house_equity,
+        0.0,
+        principal,
+        monthly_mortgage + base_house_misc_costs * base_house_equity / MONTHS,
+    )
+    rent_state = (base_house_equity * downpayment_ratio, base_rent_per_year / MONTHS)
+    cumulative_real_estate_roi = 1.0
+
+    equity_after_buying = np.empty(num_months)
+    equity_after_renting = np.empty(num_months)
+    for year in range(num_years):
+        for month in range(MONTHS):
+            m = year * MONTHS + month
+            equity_after_buying[m] = buy_state[0] + buy_state[1] - buy_state[2]
+            equity_after_renting[m] = rent_state[0]
+
+            buy_state, rent_state = _step_pair(
+                buy_state,
+                rent_state,
+                g_re_m,
+                g_eq_m,
+                monthly_income,
+                mortgage_principal_decrement,
+            )
+            cumulative_real_estate_roi *= g_re_m
+
+        # Annual reevaluation of the misc costs and the rent.
+        buy_real_estate, buy_stocks, buy_mortgage, _ = buy_state
+        buy_expenses = (
+            monthly_mortgage
+            + base_house_misc_costs * base_house_equity * cumulative_real_estate_roi / MONTHS
+        )
+        buy_state = (buy_real_estate, buy_stocks, buy_mortgage, buy_expenses)
+        rent_state = (rent_state[0], base_rent_per_year * cumulative_real_estate_roi / MONTHS)
+
+    return equity_after_buying, equity_after_renting
+
+
+def simulate_compiled(params: Parameters):
+    """Computes the same trajectories as `simulate_by_month` through a numba kernel.
+
+    Meant for parameter sweeps, where the one-off compilation cost is amortized.
+    """
+    equity_after_buying, equity_after_renting = _simulate_core(
+        float(params.roi_real_estate),
+        float(params.roi_stocks),
+        float(params.mortgage_interest_rate),
+        float(params.base_house_misc_costs),
+        float(params.downpayment_ratio),
+        float(params.base_house_equity),
+        float(params.base_rent_per_year),
+        float(params.monthly_income),
+        int(params.num_years),
+    )
+    times = np.arange(params.num_years * MONTHS) / MONTHS
+    return equity_after_buying, equity_after_renting, times
+
+
+def simulate_monte_carlo(
+    params: Parameters,
+    n_paths: int,
+    rng: np.random.Generator,
+    roi_stocks_std: float = 0.15,
+    roi_real_estate_std: float = 0.05,
+    percentiles=(5, 50, 95),
+    dtype=np.float64,
+):
+    """Simulates buying and renting for `n_paths` sampled annual rates of return.
+
+    The ROIs of every path are drawn from normal distributions centered on `params`.
+    Months are stepped sequentially while all paths advance together. Returns the
+    `percentiles` of the final net worth after buying and renting.
+    """
+    num_months = params.num_years * MONTHS
+    # Returns below -100% would make the monthly growth factors undefined.
+    roi_stocks = np.maximum(
+        rng.normal(params.roi_stocks, roi_stocks_std, n_paths), -1.0
+    ).astype(dtype)
+    roi_real_estate = np.maximum(
+        rng.normal(params.roi_real_estate, roi_real_estate_std, n_paths), -1.0
+    ).astype(dtype)
+    g_eq_m = (1 + roi_stocks) ** (1.0 / MONTHS)
+    g_re_m = (1 + roi_real_estate) ** (1.0 / MONTHS)
+
+    monthly_mortgage = get_monthly_mortgage_repayment(params)
+    base_mortgage = params.base_house_equity * (1.0 - params.downpayment_ratio)
+    buy_real_estate = np.full(n_paths, params.base_house_equity, dtype=dtype)
+    buy_stocks = np.zeros(n_paths, dtype=dtype)
+    buy_expenses = np.full(
+        n_paths,
+        monthly_mortgage
+        + params.base_house_misc_costs * params.base_house_equity / MONTHS,
+        dtype=dtype,
+    )
+    rent_stocks = np.full(
+        n_paths, params.base_house_equity * params.downpayment_ratio, dtype=dtype
+    )
+    rent_expenses = np.full(n_paths, params.base_rent_per_year / MONTHS, dtype=dtype)
+    cumulative_real_estate_roi = np.ones(n_paths, dtype=dtype)
+
+    # The last plotted month has seen `num_months - 1` increments.
+    for m in range(num_months - 1):
+        buy_stocks *= g_eq_m
+        buy_stocks += params.monthly_income - buy_expenses
+        buy_real_estate *= g_re_m
+        rent_stocks *= g_eq_m
+        rent_stocks += params.monthly_income - rent_expenses
+        cumulative_real_estate_roi *= g_re_m
+
+        if (m + 1) % MONTHS == 0:
+            buy_expenses = monthly_mortgage + (
+                params.base_house_misc_costs
+                * params.base_house_equity
+                * cumulative_real_estate_roi
+                / MONTHS
+            )
+            rent_expenses = params.base_rent_per_year * cumulative_real_estate_roi / MONTHS
+
+    # The mortgage is uniformly repaid, regardless of the path.
+    remaining_mortgage = base_mortgage * (1.0 - (num_months - 1) / num_months)
+    equity_after_buying = buy_real_estate + buy_stocks - remaining_mortgage
+    return (
+        np.percentile(equity_after_buying, percentiles),
+        np.percentile(rent_stocks, percentiles),
+    )
+
+
 ################################################################################
 # Legacy functions taking a time and providing the equity through calculations.
 ################################################################################
 
 
 def get_monthly_mortgage_repayment(params: Parameters):
-    # Returns negative for a payment.
+    # Fixed annuity payment that repays the mortgage at the end of every month.
     monthly_mortgage_rate = ((1 + params.mortgage_interest_rate) ** (1 / MONTHS)) - 1
-    return -npf.pmt(
+    return _pmt(
         monthly_mortgage_rate,
         params.num_years * MONTHS,
         params.base_house_equity * (1 - params.downpayment_ratio),
-        fv=0,
-        when="end",
     )
 
 
 def get_current_equity_after_buying(time_in_years, params: Parameters):
+    # Accepts a scalar or an array of times, evaluating all of them elementwise.
+    time_in_years = np.asarray(time_in_years, dtype=np.float64)
     # Consider value of house after annual compounding for `time_in_years`.
-    cumulative_growth = (1 + params.roi_real_estate) ** time_in_years
+    cumulative_growth = np.power(1 + params.roi_real_estate, time_in_years)
     value_of_house = params.base_house_equity * cumulative_growth
     total_mortgage_payments = (
         get_monthly_mortgage_repayment(params) * time_in_years * MONTHS
@@ -194,22 +496,36 @@ def get_current_equity_after_buying(time_in_years, params: Parameters):
     return value_of_house - total_mortgage_payments - total_house_misc_costs
 
 
+def _geometric_series_sum(ratio, num_terms):
+    # Sum of `ratio ** k` for `k` in `[0, num_terms)`.
+    if ratio == 1:
+        return num_terms
+    return (ratio**num_terms - 1) / (ratio - 1)
+
+
 def get_current_equity_after_renting(time_in_years, params: Parameters):
     # Consider value of investments, only consider difference vs the buying scenario.
-    year_idx = np.array(range(time_in_years + 1))
     annual_savings_by_not_buying = (get_monthly_mortgage_repayment(params) * MONTHS) + (
         params.base_house_misc_costs * params.base_house_equity
     )
-    # Rent increases by `roi_real_estate` every year.
-    rent_by_year = params.base_rent_per_year * np.power(
-        1 + params.roi_real_estate, year_idx
+    # Every year `k` in `[0, time_in_years]` invests the savings minus the rent, which
+    # increases by `roi_real_estate` every year. The investment then compounds by
+    # `roi_stocks` for the remaining `time_in_years - k` years, so both terms are
+    # geometric series in `k`.
+    stocks_growth = (1 + params.roi_stocks) ** time_in_years
+    total_savings = annual_savings_by_not_buying * _geometric_series_sum(
+        1 + params.roi_stocks, time_in_years + 1
+    )
+    total_rent = (
+        params.base_rent_per_year
+        * stocks_growth
+        * _geometric_series_sum(
+            (1 + params.roi_real_estate) / (1 + params.roi_stocks), time_in_years + 1
+        )
     )
-    excess_capital_by_year = annual_savings_by_not_buying - rent_by_year
     # In the first year, we have an excess of the house downpayment.
-    excess_capital_by_year[0] += params.downpayment_ratio * params.base_house_equity
-    # Stock investment growth by year. Year 0 would have the highest as it would see the most compounding.
-    cumulative_growth = np.power((1 + params.roi_stocks), time_in_years - year_idx)
-    return np.sum(excess_capital_by_year * cumulative_growth)
+    downpayment = params.downpayment_ratio * params.base_house_equity * stocks_growth
+    return total_savings - total_rent + downpayment
 
 
 def calculate_monthly_financials(params: Parameters):
@@ -1,3 +1,6 @@
+import copy
+import dataclasses
+import numpy as np
 import unittest
 import utils
 
@@ -8,6 +11,10 @@ def get_default_parameters() -> Parameters:
     return Parameters(0.05, 0.07, 0.04, 2, 0.2, 500000, 25, 20000, 30, 0)
 
 
+def get_default_parameters_with_income(monthly_income=8000) -> Parameters:
+    return dataclasses.replace(get_default_parameters(), monthly_income=monthly_income)
+
+
 def get_balanced_rent_no_growth_parameters(house_value=500000) -> Parameters:
     num_years = 30
     downpayment = 0.2
@@ -27,6 +34,47 @@ class TestFinancialCalculations(unittest.TestCase):
             params.base_house_equity * (1 - params.downpayment_ratio),
         )
 
+    def test_mortgage_repayment_discounts_to_principal(self):
+        params = get_default_parameters()
+        result = utils.get_monthly_mortgage_repayment(params)
+        monthly_rate = (1 + params.mortgage_interest_rate) ** (1 / utils.MONTHS) - 1
+        num_payments = params.num_years * utils.MONTHS
+        discounted_payments = sum(
+            result / (1 + monthly_rate) ** (month + 1) for month in range(num_payments)
+        )
+        self.assertAlmostEqual(
+            discounted_payments,
+            params.base_house_equity * (1 - params.downpayment_ratio),
+            places=4,
+        )
+
+    def test_equity_after_renting_matches_annual_investments(self):
+        for params in [get_default_parameters(), get_balanced_rent_no_growth_parameters()]:
+            time_in_years = 20
+            annual_savings = utils.get_monthly_mortgage_repayment(
+                params
+            ) * utils.MONTHS + (params.base_house_misc_costs * params.base_house_equity)
+            expected = params.downpayment_ratio * params.base_house_equity * (
+                1 + params.roi_stocks
+            ) ** time_in_years
+            for year in range(time_in_years + 1):
+                rent = params.base_rent_per_year * (1 + params.roi_real_estate) ** year
+                expected += (annual_savings - rent) * (1 + params.roi_stocks) ** (
+                    time_in_years - year
+                )
+            self.assertAlmostEqual(
+                utils.get_current_equity_after_renting(time_in_years, params) / expected,
+                1.0,
+            )
+
+    def test_equity_after_buying_accepts_array_of_times(self):
+        params = get_default_parameters()
+        times = np.arange(params.num_years * utils.MONTHS) / utils.MONTHS
+        np.testing.assert_allclose(
+            utils.get_current_equity_after_buying(times, params),
+            [utils.get_current_equity_after_buying(t, params) for t in times],
+        )
+
     def test_equity_after_rent_or_buy_in_first_year_always_equal(self):
         params = get_default_parameters()
         buy = utils.FinancialStatus(decision=Decision.BUY, params=params)
@@ -69,6 +117,99 @@ class TestFinancialCalculations(unittest.TestCase):
             )
             rent.increment_by_month()
 
+    def test_copied_status_steps_independently(self):
+        params = get_default_parameters()
+        for decision in Decision:
+            with self.subTest(decision=decision):
+                status = utils.FinancialStatus(decision=decision, params=params)
+                initial_net_worth = status.net_worth()
+                copied = copy.copy(status)
+                for _ in range(utils.MONTHS):
+                    copied.increment_by_month()
+                self.assertEqual(status.net_worth(), initial_net_worth)
+                self.assertNotEqual(copied.net_worth(), initial_net_worth)
+
+    def test_statuses_compare_by_identity_and_are_hashable(self):
+        params = get_default_parameters()
+        status = utils.FinancialStatus(decision=Decision.BUY, params=params)
+        other = utils.FinancialStatus(decision=Decision.BUY, params=params)
+        self.assertNotEqual(status, other)
+        self.assertEqual(len({status, other}), 2)
+
+    def test_increment_after_simulation_reevaluates_at_year_end(self):
+        params = dataclasses.replace(get_default_parameters_with_income(), num_years=2)
+        buy = utils.FinancialStatus(decision=Decision.BUY, params=params)
+        rent = utils.FinancialStatus(decision=Decision.RENT, params=params)
+        reference = utils.FinancialStatus(decision=Decision.RENT, params=params)
+        utils.simulate_by_month(buy, rent)
+        for _ in range(params.num_years * utils.MONTHS):
+            reference.increment_by_month()
+        expenses = rent.monthly_expenses
+        for month in range(1, utils.MONTHS + 1):
+            rent.increment_by_month()
+            reference.increment_by_month()
+            # Rent only increases once the following year is complete.
+            if month < utils.MONTHS:
+                self.assertEqual(rent.monthly_expenses, expenses)
+            else:
+                self.assertGreater(rent.monthly_expenses, expenses)
+            self.assertAlmostEqual(rent.monthly_expenses, reference.monthly_expenses)
+            self.assertAlmostEqual(rent.net_worth(), reference.net_worth())
+
+    def test_fast_simulations_match_monthly_simulation(self):
+        params = get_default_parameters_with_income()
+        buy = utils.FinancialStatus(decision=Decision.BUY, params=params)
+        rent = utils.FinancialStatus(decision=Decision.RENT, params=params)
+        expected = utils.simulate_by_month(buy, rent)
+        for simulate in (utils.simulate_vectorized, utils.simulate_compiled):
+            with self.subTest(simulate=simulate.__name__):
+                for actual_values, expected_values in zip(simulate(params), expected):
+                    np.testing.assert_allclose(
+                        actual_values, expected_values, rtol=1e-9
+                    )
+
+    def test_float32_simulation_close_to_float64(self):
+        params = get_default_parameters_with_income()
+        for actual_values, expected_values in zip(
+            utils.simulate_vectorized(params, dtype=np.float32),
+            utils.simulate_vectorized(params),
+        ):
+            self.assertEqual(actual_values.dtype, np.float32)
+            np.testing.assert_allclose(actual_values, expected_values, rtol=1e-4)
+
+    def test_monte_carlo_without_variance_matches_final_net_worth(self):
+        params = get_default_parameters_with_income()
+        buy_percentiles, rent_percentiles = utils.simulate_monte_carlo(
+            params,
+            n_paths=16,
+            rng=np.random.default_rng(0),
+            roi_stocks_std=0,
+            roi_real_estate_std=0,
+        )
+        net_worth_buy, net_worth_rent, _ = utils.simulate_vectorized(params)
+        np.testing.assert_allclose(buy_percentiles, net_worth_buy[-1], rtol=1e-9)
+        np.testing.assert_allclose(rent_percentiles, net_worth_rent[-1], rtol=1e-9)
+
+    def test_monte_carlo_percentiles_ordered_and_reproducible(self):
+        params = get_default_parameters_with_income()
+
+        def simulate(seed):
+            # A wide spread samples returns below -100%, which must be clamped.
+            return utils.simulate_monte_carlo(
+                params,
+                n_paths=256,
+                rng=np.random.default_rng(seed),
+                roi_stocks_std=0.6,
+                roi_real_estate_std=0.6,
+            )
+
+        results = simulate(seed=7)
+        for percentiles in results:
+            self.assertTrue(np.all(np.isfinite(percentiles)))
+            self.assertTrue(np.all(np.diff(percentiles) > 0))
+        for actual, expected in zip(simulate(seed=7), results):
+            np.testing.assert_array_equal(actual, expected)
+
 
 if __name__ == "__main__":
     unittest.main()